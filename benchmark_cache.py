@@ -0,0 +1,122 @@
+"""
+Benchmark načítání 20leté historie z cache: textová data (schéma v1) vs. epoch-day (schéma v2).
+
+Spuštění: python benchmark_cache.py
+"""
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+from qqq_gap_analysis import DataCache
+
+SYMBOLS = ["QQQ", "SPY", "IWM", "^VIX"]
+YEARS = 20
+REPEATS = 50
+
+
+def create_v1_db(path):
+    """Vytvoří databázi ve schématu v1 (datum jako TEXT) se syntetickými daty."""
+    dates = pd.bdate_range(end="2025-12-31", periods=252 * YEARS)
+    rng = np.random.default_rng(42)
+
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE price_data (
+            symbol TEXT NOT NULL, date TEXT NOT NULL,
+            open REAL NOT NULL, high REAL NOT NULL, low REAL NOT NULL, close REAL NOT NULL,
+            volume INTEGER NOT NULL, PRIMARY KEY (symbol, date)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE metadata (
+            symbol TEXT PRIMARY KEY, last_updated TEXT NOT NULL, start_date TEXT, end_date TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE corporate_actions (
+            symbol TEXT NOT NULL, date TEXT NOT NULL, dividend REAL NOT NULL,
+            split REAL NOT NULL, dividend_factor REAL NOT NULL, PRIMARY KEY (symbol, date)
+        )
+    ''')
+
+    for symbol in SYMBOLS:
+        close = 100 * np.cumprod(1 + rng.normal(0, 0.01, len(dates)))
+        conn.executemany(
+            'INSERT INTO price_data VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [
+                (symbol, d.strftime('%Y-%m-%d'), c * 0.999, c * 1.01, c * 0.99, c, int(v))
+                for d, c, v in zip(dates, close, rng.integers(1e6, 5e7, len(dates)))
+            ]
+        )
+        conn.execute(
+            'INSERT INTO metadata VALUES (?, ?, ?, ?)',
+            (symbol, '2025-12-31T23:00:00', dates[0].strftime('%Y-%m-%d'), dates[-1].strftime('%Y-%m-%d'))
+        )
+
+    conn.execute('PRAGMA user_version = 1')
+    conn.commit()
+    conn.close()
+    return dates
+
+
+def read_v1(path, symbol, start_date, end_date):
+    """Původní čtení (schéma v1): textové porovnání, read_sql_query, to_datetime."""
+    conn = sqlite3.connect(path)
+    try:
+        query = f"SELECT * FROM price_data WHERE symbol = '{symbol}'"
+        query += f" AND date >= '{start_date.strftime('%Y-%m-%d')}'"
+        query += f" AND date <= '{end_date.strftime('%Y-%m-%d')}'"
+        query += " ORDER BY date"
+
+        df = pd.read_sql_query(query, conn)
+        df['date'] = pd.to_datetime(df['date'])
+        df = df.set_index('date')
+        df = df[['open', 'high', 'low', 'close', 'volume']]
+        df.columns = ['Open', 'High', 'Low', 'Close', 'Volume']
+        return df
+    finally:
+        conn.close()
+
+
+def measure(func):
+    """Vrátí medián času v ms (po zahřívacím běhu)."""
+    func()
+    times = []
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - t0) * 1000)
+    return np.median(times)
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    db_path = str(Path(tmp) / "bench.db")
+    dates = create_v1_db(db_path)
+    start_date, end_date = dates[0].date(), dates[-1].date()
+
+    print(f"Historie: {len(dates)} dnů ({YEARS} let) × {len(SYMBOLS)} symbolů, {REPEATS} opakování")
+
+    before = measure(lambda: read_v1(db_path, "QQQ", start_date, end_date))
+    df_before = read_v1(db_path, "QQQ", start_date, end_date)
+
+    t0 = time.perf_counter()
+    cache = DataCache(db_path)  # migrace v1 -> v2
+    migration = (time.perf_counter() - t0) * 1000
+
+    after = measure(lambda: cache.get_cached_data("QQQ", start_date, end_date, adjusted=False))
+    after_adjusted = measure(lambda: cache.get_cached_data("QQQ", start_date, end_date))
+    df_after = cache.get_cached_data("QQQ", start_date, end_date, adjusted=False)
+
+    pd.testing.assert_frame_equal(df_before, df_after, check_names=False, check_index_type=False)
+
+    print(f"\nMigrace schématu v1 -> v2:      {migration:8.2f} ms")
+    print(f"Čtení před (TEXT datum):        {before:8.2f} ms")
+    print(f"Čtení po (epoch-day, surová):   {after:8.2f} ms  ({before / after:.1f}x)")
+    print(f"Čtení po (epoch-day, upravená): {after_adjusted:8.2f} ms")
+    print("\n✅ Data po migraci jsou shodná.")
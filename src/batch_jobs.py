@@ -0,0 +1,286 @@
+"""
+QQQ Gap Analysis - Dávkové spouštění
+
+Spouští více analýz z jednoho job souboru (TOML nebo YAML). Joby se seskupí
+podle symbolu, každý symbol se stáhne a obohatí jen jednou (pro nejdelší
+požadované období), kratší období jsou pohledy na stejnou historii a joby
+běží souběžně. Statistiky všech jobů se uloží do jednoho CSV.
+
+Příklad job souboru (TOML):
+
+    output = "nightly_report.csv"
+    workers = 4
+
+    [defaults]
+    symbol = "QQQ"
+    years = 5
+
+    [[jobs]]
+    threshold = -3.0
+
+    [[jobs]]
+    years = 20
+    percentile = 5
+    point_in_time = true
+
+    [[jobs]]
+    threshold = -3.0
+    conditions = ["^VIX>30"]
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from qqq_gap_analysis import (
+    download_qqq_data,
+    calculate_daily_return,
+    identify_extreme_drops,
+    calculate_next_day_gap_up,
+    compute_stats,
+    parse_condition,
+    resample_bars,
+    AuxiliaryPanel,
+    TIMEFRAMES,
+)
+
+
+JOB_DEFAULTS = {
+    'name': None,
+    'symbol': 'QQQ',
+    'years': 5,
+    'threshold': None,
+    'percentile': None,
+    'point_in_time': False,
+    'window': None,
+    'conditions': None,
+    'timeframe': 'D',
+}
+
+# Povolené typy hodnot (None = nezadáno); bool není int ani float
+JOB_TYPES = {
+    'name': (str,),
+    'symbol': (str,),
+    'years': (int,),
+    'threshold': (int, float),
+    'percentile': (int, float),
+    'point_in_time': (bool,),
+    'window': (int,),
+    'conditions': (str, list),
+    'timeframe': (str,),
+}
+
+FILE_KEYS = {'output', 'workers', 'defaults', 'jobs'}
+
+STATS_COLUMNS = [
+    'total_days', 'gap_up_days', 'gap_down_days', 'probability', 'ci_lower', 'ci_upper',
+    'avg_gap', 'median_gap', 'std_gap', 'avg_drop', 'min_drop', 'max_drop'
+]
+
+
+def empty_stats():
+    """Statistika pro job bez událostí: nulové počty, ostatní NaN (ne skutečných 0 %)."""
+    stats = {key: np.nan for key in STATS_COLUMNS}
+    stats.update(total_days=0, gap_up_days=0, gap_down_days=0)
+    return stats
+
+
+def _check_keys(entry, where):
+    """Ověří, že job (nebo [defaults]) obsahuje jen známé klíče se správnými typy."""
+    unknown = set(entry) - set(JOB_DEFAULTS)
+    if unknown:
+        raise ValueError(f"{where}: neznámé klíče {', '.join(sorted(unknown))}")
+    
+    for key, value in entry.items():
+        types = JOB_TYPES[key]
+        if value is None:
+            continue
+        if (isinstance(value, bool) and bool not in types) or not isinstance(value, types):
+            names = ' nebo '.join(t.__name__ for t in types)
+            raise ValueError(f"{where}: {key} musí být {names}, ne {value!r}")
+        if key == 'conditions' and isinstance(value, list) and not all(isinstance(c, str) for c in value):
+            raise ValueError(f"{where}: conditions musí být seznam řetězců")
+
+
+def load_job_file(path):
+    """Načte job soubor (TOML nebo YAML podle přípony).
+
+    Returns:
+        Dict s klíči jobs, output, workers
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+
+    if suffix == '.toml':
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            try:
+                import tomli as tomllib
+            except ImportError:
+                raise ImportError("Pro TOML job soubory na Pythonu < 3.11 nainstalujte tomli: pip install tomli")
+        with open(path, 'rb') as f:
+            config = tomllib.load(f)
+    elif suffix in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("Pro YAML job soubory nainstalujte PyYAML: pip install pyyaml")
+        with open(path, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f) or {}
+    else:
+        raise ValueError(f"Nepodporovaný formát job souboru: {path.name} (očekáváno .toml, .yaml, .yml)")
+
+    unknown = set(config) - FILE_KEYS
+    if unknown:
+        raise ValueError(f"{path.name}: neznámé klíče {', '.join(sorted(unknown))}")
+    workers = config.get('workers')
+    if workers is not None and (isinstance(workers, bool) or not isinstance(workers, int) or workers < 1):
+        raise ValueError(f"{path.name}: workers musí být kladné celé číslo")
+
+    _check_keys(config.get('defaults', {}), 'defaults')
+    defaults = {**JOB_DEFAULTS, **config.get('defaults', {})}
+    jobs = []
+
+    for i, entry in enumerate(config.get('jobs', []), start=1):
+        _check_keys(entry, f"Job {i}")
+
+        job = {**defaults, **entry}
+        if job['years'] < 1:
+            raise ValueError(f"Job {i}: years musí být alespoň 1")
+        if job['threshold'] is not None and job['percentile'] is not None:
+            raise ValueError(f"Job {i}: zadejte buď threshold, nebo percentile")
+        if job['window'] is not None and job['window'] < 1:
+            raise ValueError(f"Job {i}: window musí být alespoň 1")
+        if job['window'] is not None and not job['point_in_time']:
+            raise ValueError(f"Job {i}: window lze použít jen s point_in_time")
+        if job['point_in_time'] and job['percentile'] is None:
+            raise ValueError(f"Job {i}: point_in_time lze použít jen s percentile")
+        if job['name'] is None:
+            job['name'] = f"job{i}"
+        if job['timeframe'] not in TIMEFRAMES:
+            raise ValueError(f"Job {i}: neznámý timeframe '{job['timeframe']}' (dostupné: {', '.join(TIMEFRAMES)})")
+        if isinstance(job['conditions'], str):
+            job['conditions'] = [job['conditions']]
+        for condition in job['conditions'] or []:
+            parse_condition(condition)
+        jobs.append(job)
+
+    if not jobs:
+        raise ValueError(f"Job soubor {path.name} neobsahuje žádné joby")
+
+    return {
+        'jobs': jobs,
+        'output': config.get('output'),
+        'workers': config.get('workers'),
+    }
+
+
+def window_view(df, years):
+    """Vrátí posledních `years` let historie jako řez (bez kopie dat).
+
+    Začátek okna odpovídá download_qqq_data. Indikátory jsou ale spočítané
+    nad nejdelší historií symbolu, takže první bar okna má Daily_Return,
+    Gap i RVOL vyplněné z předchozích dnů, kde samostatný běh s --years
+    má NaN (a první den tedy může být navíc událostí).
+    """
+    start_date = datetime.now().date() + timedelta(days=1) - timedelta(days=365 * years)
+    start = df.index.searchsorted(pd.Timestamp(start_date))
+    return df.iloc[start:]
+
+
+def load_symbols(jobs, use_cache=True, cache=None):
+    """Načte a obohatí data každého symbolu jednou, pro nejdelší období jeho jobů.
+
+    Pro každý použitý timeframe symbolu se bary agregují jednou a vytvoří se
+    k nim AuxiliaryPanel sdílený všemi joby, takže pomocné řady se připojí
+    jen jednou bez ohledu na počet podmínek.
+
+    Returns:
+        Dict (symbol, timeframe) -> (DataFrame s vypočtenými indikátory, AuxiliaryPanel)
+    """
+    longest = {}
+    timeframes = {}
+    for job in jobs:
+        longest[job['symbol']] = max(longest.get(job['symbol'], 0), job['years'])
+        timeframes.setdefault(job['symbol'], set()).add(job['timeframe'])
+
+    frames = {}
+    for symbol, years in longest.items():
+        print(f"\nNačítám {symbol} ({years} let)...")
+        daily = download_qqq_data(symbol=symbol, years=years, use_cache=use_cache, cache=cache)
+
+        for timeframe in sorted(timeframes[symbol]):
+            df = resample_bars(daily, symbol, timeframe, use_cache=use_cache, cache=cache)
+            df = calculate_daily_return(df)
+            panel = AuxiliaryPanel(df, symbol, years, use_cache=use_cache, cache=cache, timeframe=timeframe)
+            frames[(symbol, timeframe)] = (df, panel)
+
+    return frames
+
+
+def run_job(job, df, panel=None):
+    """Spustí jeden job nad předem načtenými daty.
+
+    Returns:
+        Dict s parametry jobu, použitým prahem a statistikou
+    """
+    view = window_view(df, job['years'])
+
+    extreme_drops, cutoff = identify_extreme_drops(
+        view,
+        threshold=job['threshold'],
+        percentile=job['percentile'],
+        point_in_time=job['point_in_time'],
+        window=job['window'],
+        verbose=False,
+        conditions=job['conditions'],
+        panel=panel
+    )
+    gap_results = calculate_next_day_gap_up(view, extreme_drops)
+    stats = compute_stats(gap_results) or empty_stats()
+
+    conditions = ' a '.join(job['conditions']) if job['conditions'] else None
+    return {**job, 'conditions': conditions, 'cutoff': cutoff, **stats}
+
+
+def run_jobs(jobs, use_cache=True, cache=None, workers=None):
+    """Spustí všechny joby; data se sdílí mezi joby stejného symbolu.
+
+    Returns:
+        DataFrame s jedním řádkem na job
+    """
+    frames = load_symbols(jobs, use_cache=use_cache, cache=cache)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        rows = list(pool.map(lambda job: run_job(job, *frames[(job['symbol'], job['timeframe'])]), jobs))
+
+    return pd.DataFrame(rows, columns=list(JOB_DEFAULTS) + ['cutoff'] + STATS_COLUMNS)
+
+
+def run_job_file(path, use_cache=True, cache=None):
+    """Načte job soubor, spustí joby a uloží souhrnné CSV.
+
+    Returns:
+        Název výstupního souboru
+    """
+    config = load_job_file(path)
+    jobs = config['jobs']
+
+    print(f"Job soubor: {path} ({len(jobs)} jobů, {len({job['symbol'] for job in jobs})} symbolů)")
+
+    results = run_jobs(jobs, use_cache=use_cache, cache=cache, workers=config['workers'])
+
+    print("\n" + "="*70)
+    print("SOUHRN DÁVKY")
+    print("="*70)
+    summary = results[['name', 'symbol', 'timeframe', 'years', 'cutoff', 'total_days', 'probability', 'ci_lower', 'ci_upper']]
+    print(summary.to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+
+    filename = config['output'] or f"batch_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    results.to_csv(filename, index=False)
+
+    return filename
@@ -24,3 +24,10 @@ OUTPUT_COLUMNS = [
 # Formátování
 DECIMAL_PLACES = 2
 PERCENTAGE_DECIMAL_PLACES = 2
+
+# Prefetch (předehřátí cache po zavření / před otevřením trhu)
+PREFETCH_UNIVERSE = ['QQQ', 'SPY', 'IWM', 'DIA', '^VIX']
+PREFETCH_YEARS = 10
+PREFETCH_WORKERS = 4  # Maximální počet souběžných stahování
+PREFETCH_RATE_LIMIT = 1.0  # Maximální počet požadavků na Yahoo za sekundu
+PREFETCH_RETRIES = 3
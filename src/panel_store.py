@@ -0,0 +1,279 @@
+"""
+QQQ Gap Analysis - Sdílený panel pro process pool
+
+Načte OHLCV celého universa symbolů z cache jednou do bloků
+multiprocessing.shared_memory. Workery se k blokům připojí přes malý
+handle (jména bloků, symboly, rozsahy) a pracují nad nimi bez kopírování,
+místo aby každý četl SQLite nebo dostával piklované DataFrame.
+
+Úklid: vlastník bloky uvolní v close() / na konci bloku with a při běžném
+ukončení interpretu. Při pádu vlastníka je uvolní resource_tracker
+z multiprocessing (sdílí ho i workery poolu spuštěné z vlastníka).
+Pád workeru ukončí běh chybou (BrokenProcessPool) místo zaseknutí,
+bloky se uvolní na konci bloku with.
+
+Spuštění:
+    python src/panel_store.py QQQ SPY IWM --threshold -3.0 --processes 4
+"""
+
+import argparse
+import secrets
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from qqq_gap_analysis import (
+    DataCache,
+    epoch_days,
+    calculate_daily_return,
+    identify_extreme_drops,
+    calculate_next_day_gap_up,
+    compute_stats,
+)
+from batch_jobs import STATS_COLUMNS, empty_stats
+
+
+FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def _attach_block(name):
+    """Připojí existující blok sdílené paměti bez převzetí odpovědnosti za úklid."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: registrace u resource_trackeru vlastníka je jen duplicitní
+        return shared_memory.SharedMemory(name=name)
+
+
+def _release_blocks(blocks, unlink):
+    """Zavře (a u vlastníka smaže) bloky sdílené paměti."""
+    for block in blocks:
+        try:
+            block.close()
+        except BufferError:
+            # Na blok ještě ukazují pohledy (DataFrame), smazání proběhne i tak
+            pass
+        if unlink:
+            try:
+                block.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class PanelStore:
+    """OHLCV universa symbolů ve sdílené paměti.
+
+    Hodnoty jsou v jednom bloku float64 tvaru (symboly, pole, dny) na
+    společném kalendáři (NaN, kde symbol neobchodoval), data v druhém
+    bloku jako epoch-day int64. Vytváří se přes create(), workery se
+    připojují přes attach(handle).
+    """
+
+    def __init__(self, handle, blocks, owner):
+        """Inicializace nad existujícími bloky (použijte create/attach)."""
+        self.handle = handle
+        self.symbols = handle['symbols']
+        self.owner = owner
+        self._positions = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self._blocks = blocks
+
+        n_dates = handle['n_dates']
+        self.values = np.ndarray((len(self.symbols), len(FIELDS), n_dates), dtype=np.float64, buffer=blocks[0].buf)
+        days = np.ndarray((n_dates,), dtype=np.int64, buffer=blocks[1].buf)
+        self.index = pd.DatetimeIndex(days.astype('datetime64[D]').astype('datetime64[ns]'), name='date')
+
+        if not owner:
+            self.values.flags.writeable = False
+
+        self._finalizer = weakref.finalize(self, _release_blocks, blocks, owner)
+
+    @classmethod
+    def create(cls, symbols, cache=None, start_date=None, end_date=None):
+        """Načte symboly z cache do nových bloků sdílené paměti.
+
+        Args:
+            symbols: Seznam ticker symbolů
+            cache: DataCache instance
+            start_date: Počáteční datum (datetime.date)
+            end_date: Koncové datum (datetime.date)
+
+        Returns:
+            PanelStore vlastnící bloky (symboly bez dat v cache se přeskočí)
+        """
+        if cache is None:
+            cache = DataCache()
+
+        frames = {}
+        for symbol in symbols:
+            df = cache.get_cached_data(symbol, start_date, end_date)
+            if df is None:
+                print(f"Symbol {symbol} není v cache, přeskakuji.")
+                continue
+            frames[symbol] = df
+
+        if not frames:
+            raise ValueError("Žádný ze symbolů není v cache")
+
+        day_arrays = {symbol: epoch_days(df.index) for symbol, df in frames.items()}
+        all_days = np.unique(np.concatenate(list(day_arrays.values())))
+        shape = (len(frames), len(FIELDS), len(all_days))
+
+        token = secrets.token_hex(4)
+        values_block = shared_memory.SharedMemory(
+            create=True, size=int(np.prod(shape)) * 8, name=f"qqqpanel_{token}_values"
+        )
+        dates_block = shared_memory.SharedMemory(
+            create=True, size=max(len(all_days), 1) * 8, name=f"qqqpanel_{token}_dates"
+        )
+
+        try:
+            values = np.ndarray(shape, dtype=np.float64, buffer=values_block.buf)
+            values[:] = np.nan
+            np.ndarray(all_days.shape, dtype=np.int64, buffer=dates_block.buf)[:] = all_days
+
+            bounds = []
+            for i, (symbol, df) in enumerate(frames.items()):
+                positions = np.searchsorted(all_days, day_arrays[symbol])
+                values[i][:, positions] = df[FIELDS].to_numpy(dtype=np.float64).T
+                first, last = int(positions[0]), int(positions[-1]) + 1
+                bounds.append((first, last, len(positions) != last - first))
+            del values
+        except BaseException:
+            _release_blocks([values_block, dates_block], unlink=True)
+            raise
+
+        handle = {
+            'symbols': list(frames),
+            'n_dates': len(all_days),
+            'bounds': bounds,
+            'blocks': [values_block.name, dates_block.name],
+        }
+        return cls(handle, [values_block, dates_block], owner=True)
+
+    @classmethod
+    def attach(cls, handle):
+        """Připojí se k blokům vytvořeným vlastníkem (jen pro čtení)."""
+        return cls(handle, [_attach_block(name) for name in handle['blocks']], owner=False)
+
+    def frame(self, symbol):
+        """Vrátí OHLCV symbolu jako DataFrame nad sdílenou pamětí.
+
+        Data se nekopírují, pokud symbol nemá uvnitř svého rozsahu díry
+        (jinak se chybějící dny vyřadí kopií).
+        """
+        i = self._positions[symbol]
+        first, last, has_gaps = self.handle['bounds'][i]
+
+        df = pd.DataFrame(self.values[i, :, first:last].T, index=self.index[first:last], columns=FIELDS, copy=False)
+        return df.dropna() if has_gaps else df
+
+    def close(self):
+        """Uvolní bloky (vlastník je zároveň smaže)."""
+        self.values = None
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+_worker_store = None
+
+
+def _init_worker(handle):
+    """Inicializace workeru: jedno připojení ke sdílenému panelu na proces."""
+    global _worker_store
+    _worker_store = PanelStore.attach(handle)
+
+
+def _analyze_symbol(task):
+    """Analýza jednoho symbolu ve workeru nad sdíleným panelem."""
+    symbol, params = task
+    df = calculate_daily_return(_worker_store.frame(symbol))
+
+    extreme_drops, cutoff = identify_extreme_drops(df, verbose=False, **params)
+    gap_results = calculate_next_day_gap_up(df, extreme_drops)
+    stats = compute_stats(gap_results) or empty_stats()
+
+    return {'symbol': symbol, 'days': len(df), 'cutoff': cutoff, **stats}
+
+
+def analyze_universe(symbols, years=5, processes=None, cache=None, **params):
+    """Spustí analýzu gapů pro universum symbolů v process poolu.
+
+    Args:
+        symbols: Seznam ticker symbolů (musí být v cache)
+        years: Počet let historie
+        processes: Počet procesů (výchozí: počet CPU)
+        cache: DataCache instance
+        **params: Parametry pro identify_extreme_drops (threshold, percentile, ...)
+
+    Returns:
+        DataFrame s jedním řádkem na symbol
+    
+    Raises:
+        RuntimeError: Pokud worker spadne (např. nedostatek paměti)
+    """
+    end_date = datetime.now().date() + timedelta(days=1)
+    start_date = end_date - timedelta(days=365 * years)
+
+    with PanelStore.create(symbols, cache=cache, start_date=start_date, end_date=end_date) as store:
+        print(f"Panel: {len(store.symbols)} symbolů × {len(store.index)} dnů "
+              f"({store.values.nbytes / 1e6:.1f} MB ve sdílené paměti)")
+
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(store.handle,)) as pool:
+            futures = [pool.submit(_analyze_symbol, (symbol, params)) for symbol in store.symbols]
+            try:
+                rows = [future.result() for future in futures]
+            except BrokenProcessPool as e:
+                # Pool po pádu zruší všechny rozpracované úlohy, viník mezi nimi
+                unfinished = [symbol for symbol, future in zip(store.symbols, futures)
+                              if not future.done() or future.exception() is not None]
+                raise RuntimeError(f"Worker spadl, nedokončené symboly: {', '.join(unfinished)}") from e
+
+    return pd.DataFrame(rows, columns=['symbol', 'days', 'cutoff'] + STATS_COLUMNS)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Analýza gapů pro universum symbolů z cache ve sdílené paměti'
+    )
+    parser.add_argument('symbols', nargs='+', help='Ticker symboly (musí být v cache)')
+    parser.add_argument('--threshold', type=float, help='Procentuální práh pro extrémní propady')
+    parser.add_argument('--percentile', type=float, help='Percentil nejhorších propadů')
+    parser.add_argument('--point-in-time', action='store_true', help='Percentil bez lookahead')
+    parser.add_argument('--window', type=int, help='Klouzavé okno pro --point-in-time')
+    parser.add_argument('--years', type=int, default=5, help='Počet let pro analýzu (výchozí: 5)')
+    parser.add_argument('--processes', type=int, help='Počet procesů (výchozí: počet CPU)')
+
+    args = parser.parse_args()
+
+    try:
+        results = analyze_universe(
+            args.symbols,
+            years=args.years,
+            processes=args.processes,
+            threshold=args.threshold,
+            percentile=args.percentile,
+            point_in_time=args.point_in_time,
+            window=args.window
+        )
+    except RuntimeError as e:
+        parser.exit(1, f"Chyba: {e}\n")
+
+    print("\n" + "="*70)
+    print("VÝSLEDKY UNIVERSA")
+    print("="*70)
+    summary = results[['symbol', 'days', 'cutoff', 'total_days', 'probability', 'ci_lower', 'ci_upper']]
+    print(summary.to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+
+
+if __name__ == '__main__':
+    main()
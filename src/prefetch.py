@@ -0,0 +1,222 @@
+"""
+QQQ Gap Analysis - Prefetch cache
+
+Obnoví cache pro universum symbolů po zavření trhu nebo před jeho otevřením,
+aby interaktivní běhy qqq_gap_analysis.py nečekaly na stahování z Yahoo Finance.
+Každý úspěšně obnovený symbol se v metadatech označí jako čerstvý až do
+dalšího otevření trhu (fresh_until), takže pozdější běhy čtou jen z cache.
+
+Stahování běží souběžně (omezený počet vláken), s limitem rychlosti
+(na každý požadavek na Yahoo, i backfill) a opakováním při chybě. Přerušený běh stačí spustit znovu – symboly už
+označené jako čerstvé se přeskočí.
+
+Spuštění (např. z cronu / Plánovače úloh po 16:15 ET):
+    python src/prefetch.py
+    python src/prefetch.py QQQ SPY ^VIX --workers 2 --rate 0.5
+"""
+
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, time as dt_time
+from zoneinfo import ZoneInfo
+
+from config import (
+    PREFETCH_UNIVERSE,
+    PREFETCH_YEARS,
+    PREFETCH_WORKERS,
+    PREFETCH_RATE_LIMIT,
+    PREFETCH_RETRIES,
+)
+from qqq_gap_analysis import DataCache, download_qqq_data
+
+
+MARKET_TZ = ZoneInfo('America/New_York')
+MARKET_OPEN = dt_time(9, 30)
+MARKET_CLOSE = dt_time(16, 0)
+SETTLE_DELAY = timedelta(minutes=15)  # Yahoo finalizuje denní bar chvíli po zavření
+RETRY_BACKOFF = 5.0  # sekund, zdvojuje se s každým pokusem
+
+
+def _next_weekday(day):
+    """Další pracovní den po daném dni."""
+    day += timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return day
+
+
+def _previous_weekday(day):
+    """Předchozí pracovní den před daným dnem."""
+    day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+
+def market_window(now=None):
+    """
+    Určí poslední kompletní seanci a čas dalšího otevření trhu.
+
+    Svátky se neuvažují – pokud data končí předchozím pracovním dnem
+    (pravděpodobně svátek), prefetch_symbol to nehlásí jako chybu,
+    jen symbol neoznačí za čerstvý a interaktivní běh stáhne data jako dřív.
+
+    Args:
+        now: Aktuální čas (aware datetime), výchozí teď
+
+    Returns:
+        (datum poslední seance, další otevření jako lokální naive datetime),
+        nebo (None, None), pokud je trh otevřený
+    """
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    today = now.date()
+
+    if today.weekday() < 5 and now.time() < MARKET_OPEN:
+        # Před otevřením: kompletní je předchozí seance
+        last_session = _previous_weekday(today)
+        next_open = datetime.combine(today, MARKET_OPEN, MARKET_TZ)
+    elif today.weekday() < 5 and now < datetime.combine(today, MARKET_CLOSE, MARKET_TZ) + SETTLE_DELAY:
+        return None, None
+    else:
+        # Po zavření nebo o víkendu
+        last_session = today if today.weekday() < 5 else _previous_weekday(today)
+        next_open = datetime.combine(_next_weekday(today), MARKET_OPEN, MARKET_TZ)
+
+    return last_session, next_open.astimezone().replace(tzinfo=None)
+
+
+class RateLimiter:
+    """Jednoduchý limit rychlosti sdílený vlákny (rovnoměrné rozestupy)."""
+
+    def __init__(self, rate):
+        """Inicializace.
+
+        Args:
+            rate: Maximální počet operací za sekundu (0 nebo None = bez limitu)
+        """
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Počká, dokud není povolena další operace."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_time)
+            self._next_time = start + self.interval
+        time.sleep(max(0.0, start - now))
+
+
+def prefetch_symbol(symbol, cache, limiter, years, retries, last_session, fresh_until, force=False):
+    """
+    Obnoví cache jednoho symbolu.
+
+    Data končící předchozím pracovním dnem před poslední seancí se berou
+    jako svátek: bez opakování a bez chyby, symbol se jen neoznačí za čerstvý.
+
+    Returns:
+        (symbol, stav, konec dat)
+    """
+    metadata = cache.get_metadata(symbol)
+    if not force and fresh_until and metadata and metadata['fresh_until']:
+        if datetime.fromisoformat(metadata['fresh_until']) >= fresh_until:
+            return symbol, 'přeskočeno (čerstvé)', metadata['end_date']
+
+    error = None
+    for attempt in range(retries):
+        try:
+            download_qqq_data(symbol=symbol, years=years, use_cache=True, cache=cache, force_refresh=True,
+                              limiter=limiter)
+            metadata = cache.get_metadata(symbol)
+
+            if last_session is None:
+                return symbol, 'obnoveno (trh otevřený)', metadata['end_date']
+            if metadata['end_date'] >= last_session.isoformat():
+                cache.set_fresh_until(symbol, fresh_until)
+                return symbol, 'obnoveno', metadata['end_date']
+            if metadata['end_date'] == _previous_weekday(last_session).isoformat():
+                return symbol, 'obnoveno (svátek?)', metadata['end_date']
+
+            error = f"data končí {metadata['end_date']}, očekáváno {last_session}"
+        except Exception as e:
+            error = str(e)
+
+        if attempt < retries - 1:
+            time.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+    return symbol, f"chyba: {error}", metadata['end_date'] if metadata else None
+
+
+def prefetch(symbols, years=PREFETCH_YEARS, workers=PREFETCH_WORKERS, rate=PREFETCH_RATE_LIMIT,
+             retries=PREFETCH_RETRIES, force=False, cache=None):
+    """
+    Obnoví cache pro seznam symbolů.
+
+    Returns:
+        Seznam (symbol, stav, konec dat)
+    """
+    if cache is None:
+        cache = DataCache()
+
+    last_session, fresh_until = market_window()
+    if last_session is None:
+        print("Trh je otevřený – data se obnoví, ale neoznačí se jako kompletní.")
+    else:
+        print(f"Poslední seance: {last_session}, čerstvost do: {fresh_until.strftime('%Y-%m-%d %H:%M')}")
+
+    limiter = RateLimiter(rate)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(prefetch_symbol, symbol, cache, limiter, years, retries, last_session, fresh_until, force)
+            for symbol in symbols
+        ]
+        return [future.result() for future in futures]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Předehřátí cache pro universum symbolů (po zavření / před otevřením trhu)'
+    )
+    parser.add_argument(
+        'symbols',
+        nargs='*',
+        help='Ticker symboly (výchozí: PREFETCH_UNIVERSE z config.py)'
+    )
+    parser.add_argument('--years', type=int, default=PREFETCH_YEARS, help=f'Počet let historie (výchozí: {PREFETCH_YEARS})')
+    parser.add_argument('--workers', type=int, default=PREFETCH_WORKERS, help=f'Souběžná stahování (výchozí: {PREFETCH_WORKERS})')
+    parser.add_argument('--rate', type=float, default=PREFETCH_RATE_LIMIT, help=f'Max. požadavků na Yahoo za sekundu (výchozí: {PREFETCH_RATE_LIMIT})')
+    parser.add_argument('--retries', type=int, default=PREFETCH_RETRIES, help=f'Počet pokusů na symbol (výchozí: {PREFETCH_RETRIES})')
+    parser.add_argument('--force', action='store_true', help='Obnoví i symboly označené jako čerstvé')
+
+    args = parser.parse_args()
+    symbols = args.symbols or PREFETCH_UNIVERSE
+
+    print("\n" + "="*70)
+    print(f"PREFETCH CACHE: {len(symbols)} symbolů")
+    print("="*70)
+
+    results = prefetch(
+        symbols,
+        years=args.years,
+        workers=args.workers,
+        rate=args.rate,
+        retries=args.retries,
+        force=args.force
+    )
+
+    print("\n" + "="*70)
+    print("SOUHRN PREFETCH")
+    print("="*70)
+    for symbol, status, end_date in results:
+        print(f"  {symbol:<8} {status:<30} {end_date or '-'}")
+
+    if any(status.startswith('chyba') for _, status, _ in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,16 +7,45 @@ from datetime import datetime, timedelta
 import sqlite3
 import os
 from pathlib import Path
+import operator
+import re
+import threading
 import warnings
 
 # Potlač FutureWarningy
 warnings.filterwarnings('ignore', category=FutureWarning)
 
 
+def epoch_days(dates):
+    """Převede data (DatetimeIndex, pole, date) na počet dnů od 1970-01-01 (int64)."""
+    return np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+
+
+def _epoch_day(date):
+    """Převede jedno datum na počet dnů od 1970-01-01."""
+    return int(np.datetime64(date, 'D').astype(np.int64))
+
+
+def _days_to_index(days):
+    """Sestaví DatetimeIndex z epoch-day čísel bez parsování řetězců."""
+    return pd.DatetimeIndex(np.asarray(days, dtype=np.int64).astype('datetime64[D]').astype('datetime64[ns]'), name='date')
+
+
 class DataCache:
     """Správa SQLite cache pro historická data."""
     
     DB_NAME = "market_data.db"
+    SCHEMA_VERSION = 3
+    
+    # Datové typy sloupců pro přímé načtení řádků do NumPy pole
+    PRICE_DTYPE = np.dtype([
+        ('date', np.int64),
+        ('open', np.float64),
+        ('high', np.float64),
+        ('low', np.float64),
+        ('close', np.float64),
+        ('volume', np.int64)
+    ])
     
     def __init__(self, db_path=None):
         """Inicializace cache.
@@ -30,22 +59,20 @@ class DataCache:
         self.db_path = db_path
         self._init_db()
     
-    def _init_db(self):
-        """Vytvoří tabulky v databázi, pokud neexistují."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+    def _create_tables(self, cursor):
+        """Vytvoří tabulky aktuálního schématu, pokud neexistují."""
+        # Datum jako počet dnů od 1970-01-01 (INTEGER), řádky seřazené podle klíče
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS price_data (
                 symbol TEXT NOT NULL,
-                date TEXT NOT NULL,
+                date INTEGER NOT NULL,
                 open REAL NOT NULL,
                 high REAL NOT NULL,
                 low REAL NOT NULL,
                 close REAL NOT NULL,
                 volume INTEGER NOT NULL,
                 PRIMARY KEY (symbol, date)
-            )
+            ) WITHOUT ROWID
         ''')
         
         cursor.execute('''
@@ -53,20 +80,110 @@ class DataCache:
                 symbol TEXT PRIMARY KEY,
                 last_updated TEXT NOT NULL,
                 start_date TEXT,
-                end_date TEXT
+                end_date TEXT,
+                fresh_until TEXT
+            )
+        ''')
+        
+        # Bary vyšších timeframů (týdenní/měsíční) odvozené z upravených denních dat
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS resampled_bars (
+                symbol TEXT NOT NULL,
+                timeframe TEXT NOT NULL,
+                date INTEGER NOT NULL,
+                open REAL NOT NULL,
+                high REAL NOT NULL,
+                low REAL NOT NULL,
+                close REAL NOT NULL,
+                volume INTEGER NOT NULL,
+                PRIMARY KEY (symbol, timeframe, date)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Platnost uložených barů: stav korporátních akcí a první použitý denní bar
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS resampled_metadata (
+                symbol TEXT NOT NULL,
+                timeframe TEXT NOT NULL,
+                actions_key TEXT NOT NULL,
+                first_day INTEGER NOT NULL,
+                PRIMARY KEY (symbol, timeframe)
             )
         ''')
         
+        # Korporátní akce: split (poměr, 1.0 = žádný) a dividendový faktor
+        # (1 - dividenda / předchozí surový Close) platný pro dny před ex-date
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS corporate_actions (
+                symbol TEXT NOT NULL,
+                date INTEGER NOT NULL,
+                dividend REAL NOT NULL,
+                split REAL NOT NULL,
+                dividend_factor REAL NOT NULL,
+                PRIMARY KEY (symbol, date)
+            )
+        ''')
+    
+    def _init_db(self):
+        """Vytvoří tabulky v databázi, pokud neexistují, a provede migrace."""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        self._create_tables(cursor)
+        self._migrate(cursor)
+        
         conn.commit()
         conn.close()
     
-    def get_cached_data(self, symbol, start_date=None, end_date=None):
+    def _migrate(self, cursor):
+        """Převede starší schéma databáze na aktuální verzi (PRAGMA user_version)."""
+        version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        
+        if version < 1:
+            # Verze 0 ukládala ceny už upravené (auto_adjust) bez faktorů,
+            # surové ceny z nich nelze zpětně získat -> cache se stáhne znovu
+            cursor.execute('SELECT COUNT(*) FROM price_data')
+            if cursor.fetchone()[0] > 0:
+                print("Cache obsahuje upravené ceny ve starém formátu, bude stažena znovu.")
+            cursor.execute('DELETE FROM price_data')
+            cursor.execute('DELETE FROM metadata')
+        
+        if version < 2:
+            # Verze 1 ukládala data jako TEXT 'YYYY-MM-DD' -> převod na epoch-day
+            for table in ('price_data', 'corporate_actions'):
+                columns = {row[1]: row[2] for row in cursor.execute(f'PRAGMA table_info({table})')}
+                if columns.get('date', '').upper() != 'TEXT':
+                    continue
+                
+                cursor.execute(f'ALTER TABLE {table} RENAME TO {table}_v1')
+                self._create_tables(cursor)
+                names = ', '.join(columns)
+                values = ', '.join(
+                    "CAST(julianday(date) - 2440587.5 AS INTEGER)" if name == 'date' else name
+                    for name in columns
+                )
+                cursor.execute(f'INSERT INTO {table} ({names}) SELECT {values} FROM {table}_v1')
+                cursor.execute(f'DROP TABLE {table}_v1')
+        
+        if version < 3:
+            # Verze 3 přidává do metadat čerstvost dat z prefetch (fresh_until)
+            columns = [row[1] for row in cursor.execute('PRAGMA table_info(metadata)')]
+            if 'fresh_until' not in columns:
+                cursor.execute('ALTER TABLE metadata ADD COLUMN fresh_until TEXT')
+        
+        cursor.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+    
+    def get_cached_data(self, symbol, start_date=None, end_date=None, adjusted=True):
         """Získá data z cache, pokud jsou dostupná.
         
+        Řádky se načtou rovnou do typovaného NumPy pole a index se sestaví
+        z epoch-day čísel, bez převodu přes řetězce.
+        
         Args:
             symbol: Ticker symbol
             start_date: Počáteční datum (datetime.date)
             end_date: Koncové datum (datetime.date)
+            adjusted: Aplikovat faktory korporátních akcí (False = surové ceny)
         
         Returns:
             DataFrame s daty nebo None, pokud data nejsou v cache
@@ -74,33 +191,39 @@ class DataCache:
         conn = sqlite3.connect(self.db_path)
         
         try:
-            query = f"SELECT * FROM price_data WHERE symbol = '{symbol}'"
+            query = 'SELECT date, open, high, low, close, volume FROM price_data WHERE symbol = ?'
+            params = [symbol]
             
             if start_date:
-                start_str = start_date.strftime('%Y-%m-%d')
-                query += f" AND date >= '{start_str}'"
+                query += ' AND date >= ?'
+                params.append(_epoch_day(start_date))
             
             if end_date:
-                end_str = end_date.strftime('%Y-%m-%d')
-                query += f" AND date <= '{end_str}'"
-            
-            query += " ORDER BY date"
-            
-            df = pd.read_sql_query(query, conn)
+                query += ' AND date <= ?'
+                params.append(_epoch_day(end_date))
             
-            if df.empty:
-                return None
+            query += ' ORDER BY date'
             
-            # Převeď řetězce na datetime index
-            df['date'] = pd.to_datetime(df['date'])
-            df = df.set_index('date')
-            df = df[['open', 'high', 'low', 'close', 'volume']]
-            df.columns = ['Open', 'High', 'Low', 'Close', 'Volume']
-            
-            return df
+            rows = np.fromiter(conn.execute(query, params), dtype=self.PRICE_DTYPE)
         
         finally:
             conn.close()
+        
+        if len(rows) == 0:
+            return None
+        
+        df = pd.DataFrame({
+            'Open': rows['open'],
+            'High': rows['high'],
+            'Low': rows['low'],
+            'Close': rows['close'],
+            'Volume': rows['volume']
+        }, index=_days_to_index(rows['date']))
+        
+        if adjusted:
+            df = apply_adjustments(df, self.get_actions(symbol))
+        
+        return df
     
     def save_data(self, symbol, df):
         """Uloží data do cache.
@@ -112,23 +235,16 @@ class DataCache:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        # Připrav data pro vložení - konvertuj na python scalary
-        data_to_insert = []
-        
-        for i in range(len(df)):
-            date_val = df.index[i]
-            date_str = date_val.strftime('%Y-%m-%d') if hasattr(date_val, 'strftime') else str(date_val)[:10]
-            row = df.iloc[i]
-            # Převeď na python scalary pomocí astype nebo item()
-            data_to_insert.append((
-                symbol,
-                date_str,
-                float(row['Open']),
-                float(row['High']),
-                float(row['Low']),
-                float(row['Close']),
-                int(row['Volume'])
-            ))
+        # Připrav data pro vložení - tolist() vrací python scalary
+        data_to_insert = zip(
+            [symbol] * len(df),
+            epoch_days(df.index).tolist(),
+            df['Open'].to_numpy(dtype=float).tolist(),
+            df['High'].to_numpy(dtype=float).tolist(),
+            df['Low'].to_numpy(dtype=float).tolist(),
+            df['Close'].to_numpy(dtype=float).tolist(),
+            df['Volume'].to_numpy(dtype=np.int64).tolist()
+        )
         
         # INSERT OR REPLACE (aktualizuj, pokud existuje)
         cursor.executemany('''
@@ -137,9 +253,19 @@ class DataCache:
             VALUES (?, ?, ?, ?, ?, ?, ?)
         ''', data_to_insert)
         
-        # Aktualizuj metadata
+        # Aktualizuj metadata - rozsah se jen rozšiřuje, kratší uložení
+        # (např. prefetch s menším počtem let) nezkrátí známou historii
         if len(df) > 0:
             dates = pd.to_datetime(df.index)
+            start_date = dates.min().strftime('%Y-%m-%d')
+            end_date = dates.max().strftime('%Y-%m-%d')
+            
+            cursor.execute('SELECT start_date, end_date FROM metadata WHERE symbol = ?', (symbol,))
+            existing = cursor.fetchone()
+            if existing:
+                start_date = min(start_date, existing[0] or start_date)
+                end_date = max(end_date, existing[1] or end_date)
+            
             cursor.execute('''
                 INSERT OR REPLACE INTO metadata 
                 (symbol, last_updated, start_date, end_date)
@@ -147,13 +273,160 @@ class DataCache:
             ''', (
                 symbol,
                 datetime.now().isoformat(),
-                dates.min().strftime('%Y-%m-%d'),
-                dates.max().strftime('%Y-%m-%d')
+                start_date,
+                end_date
             ))
         
         conn.commit()
         conn.close()
     
+    def save_actions(self, symbol, actions):
+        """Uloží korporátní akce (malá tabulka faktorů).
+        
+        Args:
+            symbol: Ticker symbol
+            actions: DataFrame s indexem ex-date a sloupci Dividend, Split, Dividend_Factor
+        """
+        if actions is None or actions.empty:
+            return
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.executemany('''
+            INSERT OR REPLACE INTO corporate_actions
+            (symbol, date, dividend, split, dividend_factor)
+            VALUES (?, ?, ?, ?, ?)
+        ''', zip(
+            [symbol] * len(actions),
+            epoch_days(actions.index).tolist(),
+            actions['Dividend'].to_numpy(dtype=float).tolist(),
+            actions['Split'].to_numpy(dtype=float).tolist(),
+            actions['Dividend_Factor'].to_numpy(dtype=float).tolist()
+        ))
+        
+        conn.commit()
+        conn.close()
+    
+    def get_actions(self, symbol):
+        """Získá korporátní akce symbolu seřazené podle data.
+        
+        Returns:
+            DataFrame s indexem ex-date a sloupci Dividend, Split, Dividend_Factor
+        """
+        conn = sqlite3.connect(self.db_path)
+        
+        try:
+            rows = np.fromiter(
+                conn.execute(
+                    'SELECT date, dividend, split, dividend_factor FROM corporate_actions '
+                    'WHERE symbol = ? ORDER BY date',
+                    (symbol,)
+                ),
+                dtype=[('date', np.int64), ('dividend', float), ('split', float), ('factor', float)]
+            )
+        finally:
+            conn.close()
+        
+        return pd.DataFrame({
+            'Dividend': rows['dividend'],
+            'Split': rows['split'],
+            'Dividend_Factor': rows['factor']
+        }, index=_days_to_index(rows['date']))
+    
+    def get_resampled(self, symbol, timeframe):
+        """Získá uložené bary vyššího timeframe.
+        
+        Returns:
+            (DataFrame s bary nebo None, dict s actions_key a first_day nebo None)
+        """
+        conn = sqlite3.connect(self.db_path)
+        
+        try:
+            meta = conn.execute(
+                'SELECT actions_key, first_day FROM resampled_metadata WHERE symbol = ? AND timeframe = ?',
+                (symbol, timeframe)
+            ).fetchone()
+            rows = np.fromiter(
+                conn.execute(
+                    'SELECT date, open, high, low, close, volume FROM resampled_bars '
+                    'WHERE symbol = ? AND timeframe = ? ORDER BY date',
+                    (symbol, timeframe)
+                ),
+                dtype=self.PRICE_DTYPE
+            )
+        finally:
+            conn.close()
+        
+        if meta is None or len(rows) == 0:
+            return None, None
+        
+        df = pd.DataFrame({
+            'Open': rows['open'],
+            'High': rows['high'],
+            'Low': rows['low'],
+            'Close': rows['close'],
+            'Volume': rows['volume']
+        }, index=_days_to_index(rows['date']))
+        
+        return df, {'actions_key': meta[0], 'first_day': meta[1]}
+    
+    def save_resampled(self, symbol, timeframe, bars, actions_key, first_day, replace=False):
+        """Uloží (nebo přepíše) bary vyššího timeframe.
+        
+        Args:
+            symbol: Ticker symbol
+            timeframe: Kód timeframe ('W', 'M')
+            bars: DataFrame s OHLCV bary (index = konec období)
+            actions_key: Otisk korporátních akcí, ze kterých bary vznikly
+            first_day: Epoch-day prvního denního baru použitého pro agregaci
+            replace: Smazat dříve uložené bary (kompletní přepočet)
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        if replace:
+            cursor.execute('DELETE FROM resampled_bars WHERE symbol = ? AND timeframe = ?', (symbol, timeframe))
+        
+        cursor.executemany('''
+            INSERT OR REPLACE INTO resampled_bars
+            (symbol, timeframe, date, open, high, low, close, volume)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', zip(
+            [symbol] * len(bars),
+            [timeframe] * len(bars),
+            epoch_days(bars.index).tolist(),
+            bars['Open'].to_numpy(dtype=float).tolist(),
+            bars['High'].to_numpy(dtype=float).tolist(),
+            bars['Low'].to_numpy(dtype=float).tolist(),
+            bars['Close'].to_numpy(dtype=float).tolist(),
+            bars['Volume'].to_numpy(dtype=np.int64).tolist()
+        ))
+        
+        cursor.execute('''
+            INSERT OR REPLACE INTO resampled_metadata
+            (symbol, timeframe, actions_key, first_day)
+            VALUES (?, ?, ?, ?)
+        ''', (symbol, timeframe, actions_key, first_day))
+        
+        conn.commit()
+        conn.close()
+    
+    def get_close_before(self, symbol, date):
+        """Vrátí poslední surový Close před daným datem (nebo None)."""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            'SELECT close FROM price_data WHERE symbol = ? AND date < ? ORDER BY date DESC LIMIT 1',
+            (symbol, _epoch_day(date))
+        )
+        
+        result = cursor.fetchone()
+        conn.close()
+        
+        return result[0] if result else None
+    
     def get_metadata(self, symbol):
         """Získá metadata o symbolu.
         
@@ -164,7 +437,7 @@ class DataCache:
         cursor = conn.cursor()
         
         cursor.execute(
-            'SELECT last_updated, start_date, end_date FROM metadata WHERE symbol = ?',
+            'SELECT last_updated, start_date, end_date, fresh_until FROM metadata WHERE symbol = ?',
             (symbol,)
         )
         
@@ -175,10 +448,29 @@ class DataCache:
             return {
                 'last_updated': result[0],
                 'start_date': result[1],
-                'end_date': result[2]
+                'end_date': result[2],
+                'fresh_until': result[3]
             }
         return None
     
+    def set_fresh_until(self, symbol, fresh_until):
+        """Označí data symbolu za kompletní až do daného času (typicky další otevření trhu).
+        
+        Args:
+            symbol: Ticker symbol
+            fresh_until: datetime (lokální čas), do kdy není potřeba stahovat
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            'UPDATE metadata SET fresh_until = ? WHERE symbol = ?',
+            (fresh_until.isoformat(), symbol)
+        )
+        
+        conn.commit()
+        conn.close()
+    
     def clear_cache(self, symbol=None):
         """Vymaže cache.
         
@@ -191,27 +483,197 @@ class DataCache:
         if symbol:
             cursor.execute('DELETE FROM price_data WHERE symbol = ?', (symbol,))
             cursor.execute('DELETE FROM metadata WHERE symbol = ?', (symbol,))
+            cursor.execute('DELETE FROM corporate_actions WHERE symbol = ?', (symbol,))
+            cursor.execute('DELETE FROM resampled_bars WHERE symbol = ?', (symbol,))
+            cursor.execute('DELETE FROM resampled_metadata WHERE symbol = ?', (symbol,))
             print(f"Cache pro {symbol} vymazána")
         else:
             cursor.execute('DELETE FROM price_data')
             cursor.execute('DELETE FROM metadata')
+            cursor.execute('DELETE FROM corporate_actions')
+            cursor.execute('DELETE FROM resampled_bars')
+            cursor.execute('DELETE FROM resampled_metadata')
             print("Veškerá cache vymazána")
         
         conn.commit()
         conn.close()
 
 
-def download_qqq_data(symbol='QQQ', years=5, use_cache=True, cache=None):
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close']
+ACTION_COLUMNS = ['Dividend', 'Split', 'Dividend_Factor']
+
+
+def _empty_actions(columns=ACTION_COLUMNS):
+    """Prázdná tabulka korporátních akcí."""
+    return pd.DataFrame({col: pd.Series(dtype=float) for col in columns}, index=pd.DatetimeIndex([]))
+
+
+def _cumulative_factor(index, action_dates, factors):
+    """Pro každé datum indexu vrátí součin faktorů všech akcí s pozdějším datem.
+    
+    Vektorizovaně: zpětný kumulativní součin faktorů + searchsorted.
+    
+    Args:
+        index: Data, pro která se faktor počítá
+        action_dates: Seřazená data akcí (ex-date)
+        factors: Faktory akcí
+    
+    Returns:
+        np.ndarray násobitelů o délce indexu
+    """
+    action_dates = np.asarray(action_dates, dtype='datetime64[ns]')
+    factors = np.asarray(factors, dtype=float)
+    
+    # suffix[k] = součin factors[k:], suffix[len] = 1
+    suffix = np.append(np.cumprod(factors[::-1])[::-1], 1.0)
+    positions = np.searchsorted(action_dates, np.asarray(index, dtype='datetime64[ns]'), side='right')
+    return suffix[positions]
+
+
+def apply_adjustments(df, actions):
+    """Aplikuje na surové OHLCV faktory korporátních akcí.
+    
+    Ceny se násobí dividendovými faktory a dělí splity všech pozdějších akcí,
+    objem se násobí pozdějšími splity (stejně jako auto_adjust v yfinance).
+    
+    Args:
+        df: DataFrame se surovými OHLCV daty
+        actions: DataFrame z DataCache.get_actions
+    
+    Returns:
+        Nový DataFrame s upravenými daty
+    """
+    adjusted = df.copy()
+    if actions is None or actions.empty:
+        return adjusted
+    
+    price_mult = _cumulative_factor(df.index, actions.index, actions['Dividend_Factor'] / actions['Split'])
+    volume_mult = _cumulative_factor(df.index, actions.index, actions['Split'])
+    
+    adjusted[PRICE_COLUMNS] = df[PRICE_COLUMNS].to_numpy(dtype=float) * price_mult[:, None]
+    adjusted['Volume'] = np.round(df['Volume'].to_numpy(dtype=float) * volume_mult).astype(np.int64)
+    return adjusted
+
+
+def _download_segment(symbol, start, end, limiter=None):
+    """Stáhne úsek dat z Yahoo Finance bez dividendové úpravy.
+    
+    Yahoo vrací ceny zpětně upravené jen o splity, proto se vrací i akce
+    (dividendy ve stejném základu a poměry splitů) pro převod na surové ceny.
+    
+    Používá Ticker.history místo yf.download, které si výsledky předává přes
+    globální stav modulu a není bezpečné při souběžném stahování (prefetch).
+    
+    Args:
+        symbol: Ticker symbol
+        start: Počáteční datum
+        end: Koncové datum (exkluzivní)
+        limiter: Volitelný limit rychlosti (objekt s metodou wait()), čeká se před každým požadavkem
+    
+    Returns:
+        (DataFrame OHLCV, DataFrame akcí se sloupci Dividend, Split)
+    """
+    if limiter is not None:
+        limiter.wait()
+    df = yf.Ticker(symbol).history(start=start, end=end, auto_adjust=False, actions=True)
+    
+    if df.empty:
+        return df, _empty_actions(['Dividend', 'Split'])
+    
+    # Index je v časové zóně burzy, cache pracuje s naive daty
+    if df.index.tz is not None:
+        df.index = df.index.tz_localize(None)
+    
+    dividends = df['Dividends'].fillna(0.0) if 'Dividends' in df else pd.Series(0.0, index=df.index)
+    splits = df['Stock Splits'].fillna(0.0) if 'Stock Splits' in df else pd.Series(0.0, index=df.index)
+    
+    actions = pd.DataFrame({
+        'Dividend': dividends,
+        'Split': splits.where(splits > 0, 1.0)
+    })
+    actions = actions[(actions['Dividend'] > 0) | (actions['Split'] != 1.0)]
+    
+    return df[PRICE_COLUMNS + ['Volume']], actions
+
+
+def _unsplit(df, splits):
+    """Převede ceny zpětně upravené o splity na surové (ceny ×, objem ÷ pozdější splity)."""
+    mult = _cumulative_factor(df.index, splits.index, splits.to_numpy())
+    raw = df.copy()
+    raw[PRICE_COLUMNS] = df[PRICE_COLUMNS].to_numpy(dtype=float) * mult[:, None]
+    raw['Volume'] = np.round(df['Volume'].to_numpy(dtype=float) / mult).astype(np.int64)
+    return raw
+
+
+def _merge_downloads(symbol, raw_frames, segments, segment_actions, stored_actions, cache):
+    """Sloučí surová data z cache se staženými úseky a dopočítá faktory nových akcí.
+    
+    Args:
+        symbol: Ticker symbol
+        raw_frames: Seznam DataFrame se surovými daty (z cache)
+        segments: Seznam stažených DataFrame (upravené o splity)
+        segment_actions: Seznam DataFrame akcí ke staženým úsekům
+        stored_actions: Akce již uložené v cache
+        cache: DataCache instance (pro Close před začátkem dat)
+    
+    Returns:
+        (surový DataFrame, DataFrame nových akcí, DataFrame všech akcí)
+    """
+    new_actions = pd.concat(segment_actions) if segment_actions else _empty_actions(['Dividend', 'Split'])
+    new_actions = new_actions[~new_actions.index.duplicated(keep='last')].sort_index()
+    
+    # Všechny známé splity (uložené + nové) pro převod na surové ceny
+    splits = pd.concat([stored_actions['Split'], new_actions['Split']])
+    splits = splits[~splits.index.duplicated(keep='last')].sort_index()
+    splits = splits[splits != 1.0]
+    
+    frames = list(raw_frames) + [_unsplit(seg, splits) for seg in segments]
+    full_df = pd.concat(frames)
+    # Odstranění duplicit (pro jistotu)
+    full_df = full_df[~full_df.index.duplicated(keep='last')]
+    full_df.sort_index(inplace=True)
+    
+    if not new_actions.empty:
+        new_actions = new_actions.copy()
+        new_actions['Dividend'] = new_actions['Dividend'].to_numpy(dtype=float) * _cumulative_factor(
+            new_actions.index, splits.index, splits.to_numpy()
+        )
+        
+        factors = []
+        for date, dividend in new_actions['Dividend'].items():
+            if dividend <= 0:
+                factors.append(1.0)
+                continue
+            previous = full_df.loc[full_df.index < date, 'Close']
+            prev_close = previous.iloc[-1] if not previous.empty else cache.get_close_before(symbol, date)
+            factors.append(1.0 - dividend / prev_close if prev_close else 1.0)
+        new_actions['Dividend_Factor'] = factors
+    else:
+        new_actions = _empty_actions()
+    
+    all_actions = pd.concat([stored_actions, new_actions])
+    all_actions = all_actions[~all_actions.index.duplicated(keep='last')].sort_index()
+    
+    return full_df, new_actions, all_actions
+
+
+def download_qqq_data(symbol='QQQ', years=5, use_cache=True, cache=None, force_refresh=False, limiter=None):
     """Stáhne historická data QQQ, primárně z cache.
     
+    Cache drží surové (neupravené) OHLCV a tabulku korporátních akcí,
+    upravená data vznikají až při čtení. Nová dividenda nebo split tak
+    přidá jen řádek do tabulky akcí místo stažení celé historie.
+    
     Args:
         symbol: Ticker symbol
         years: Počet let pro stažení
         use_cache: Používat cache
         cache: DataCache instance
+        force_refresh: Stáhnout nová data i při čerstvé cache (prefetch)
+        limiter: Limit rychlosti požadavků na Yahoo (prefetch), viz _download_segment
     
     Returns:
-        DataFrame s daty
+        DataFrame s daty (upravenými o dividendy a splity)
     """
     if cache is None:
         cache = DataCache()
@@ -221,13 +683,11 @@ def download_qqq_data(symbol='QQQ', years=5, use_cache=True, cache=None):
     end_date = today + timedelta(days=1)
     start_date = end_date - timedelta(days=365 * years)
     
-    # Zahrneme i dnešek (yfinance end je exkluzivní, takže +1 den)
-    today = datetime.now().date()
-    end_date = today + timedelta(days=1)
-    start_date = end_date - timedelta(days=365 * years)
-    
-    dfs_to_merge = []
+    raw_frames = []
+    segments = []
+    segment_actions = []
     download_start = start_date
+    stored_actions = cache.get_actions(symbol) if use_cache else _empty_actions()
 
     # Pokus se získat z cache
     if use_cache:
@@ -238,23 +698,28 @@ def download_qqq_data(symbol='QQQ', years=5, use_cache=True, cache=None):
             last_updated = datetime.fromisoformat(metadata['last_updated'])
             
             # 1. BACKFILL: Kontrola chybějící historie
-            if start_date < cache_start:
+            # (jen pokud před začátkem cache chybí nějaký pracovní den, ne jen víkend)
+            if start_date < cache_start and np.busday_count(start_date, cache_start) > 0:
                 print(f"Cache neobsahuje starší historii (začíná {cache_start}).")
                 print(f"Stahuji chybějící historii od {start_date} do {cache_start}...")
                 
-                df_backfill = yf.download(symbol, start=start_date, end=cache_start, progress=False, auto_adjust=True)
-                if isinstance(df_backfill.columns, pd.MultiIndex):
-                    df_backfill.columns = df_backfill.columns.get_level_values(0)
+                df_backfill, actions_backfill = _download_segment(symbol, start_date, cache_start, limiter)
                 
                 if not df_backfill.empty:
                     print(f"Staženo {len(df_backfill)} historických dnů.")
-                    dfs_to_merge.append(df_backfill)
+                    segments.append(df_backfill)
+                    segment_actions.append(actions_backfill)
             
             # 2. FRESHNESS CHECK
+            # Čerstvá je cache aktualizovaná před méně než hodinou, nebo označená
+            # prefetchem jako kompletní až do dalšího otevření trhu
             is_recent_fresh = (datetime.now() - last_updated < timedelta(hours=1))
+            if metadata['fresh_until']:
+                is_recent_fresh = is_recent_fresh or datetime.now() < datetime.fromisoformat(metadata['fresh_until'])
+            is_recent_fresh = is_recent_fresh and not force_refresh
             
             # Pokud je cache čerstvá a nemáme backfill, vrátíme ji rovnou
-            if is_recent_fresh and not dfs_to_merge:
+            if is_recent_fresh and not segments:
                 print(f"Cache je čerstvá a kompletní (aktualizováno: {last_updated.strftime('%H:%M:%S')}).")
                 print(f"Načítám kompletní data z cache...")
                 return cache.get_cached_data(symbol, start_date, end_date)
@@ -269,49 +734,137 @@ def download_qqq_data(symbol='QQQ', years=5, use_cache=True, cache=None):
             
             if cache_query_start < safe_history_date:
                 print(f"Načítám data z cache (do {safe_history_date})...")
-                df_cache = cache.get_cached_data(symbol, cache_query_start, safe_history_date)
+                df_cache = cache.get_cached_data(symbol, cache_query_start, safe_history_date, adjusted=False)
                 
                 if df_cache is not None and not df_cache.empty:
                     print(f"Načteno {len(df_cache)} dnů z cache.")
-                    dfs_to_merge.append(df_cache)
+                    raw_frames.append(df_cache)
                     # Další stahování začne po konci cache
                     download_start = df_cache.index[-1].date() + timedelta(days=1)
                 else:
                     # Cache vrátila prázdno? Stáhneme vše od začátku (pokud nebyl backfill)
-                    if not dfs_to_merge:
+                    if not segments:
                         download_start = start_date
             else:
                 # Cache je příliš krátká/nová, stahujeme vše
-                if not dfs_to_merge:
+                if not segments:
                     download_start = start_date
 
     # 4. FORWARD FILL (Recent data)
     if download_start < end_date:
         print(f"Stahování nových dat od {download_start} do {end_date}...")
-        df_fresh = yf.download(symbol, start=download_start, end=end_date, progress=False, auto_adjust=True)
-        
-        if isinstance(df_fresh.columns, pd.MultiIndex):
-            df_fresh.columns = df_fresh.columns.get_level_values(0)
+        df_fresh, actions_fresh = _download_segment(symbol, download_start, end_date, limiter)
         
         if not df_fresh.empty:
             print(f"Staženo {len(df_fresh)} nových dnů.")
-            dfs_to_merge.append(df_fresh)
+            segments.append(df_fresh)
+            segment_actions.append(actions_fresh)
             
     # 5. MERGE & SAVE
-    if dfs_to_merge:
-        full_df = pd.concat(dfs_to_merge)
-        # Odstranění duplicit (pro jistotu)
-        full_df = full_df[~full_df.index.duplicated(keep='last')]
-        full_df.sort_index(inplace=True)
+    if raw_frames or segments:
+        full_df, new_actions, all_actions = _merge_downloads(
+            symbol, raw_frames, segments, segment_actions, stored_actions, cache
+        )
         
         if use_cache:
             cache.save_data(symbol, full_df)
+            cache.save_actions(symbol, new_actions)
+            if not new_actions.empty:
+                print(f"Uloženo {len(new_actions)} korporátních akcí (dividendy/splity).")
             
-        return full_df
+        return apply_adjustments(full_df, all_actions)
     
     raise ValueError("Nepodařilo se získat žádná data")
 
 
+TIMEFRAMES = {
+    'D': None,
+    'W': pd.offsets.Week(weekday=4),  # týdny končící pátkem
+    'M': pd.offsets.MonthEnd(),
+}
+
+OHLCV_AGGREGATION = {
+    'Open': 'first',
+    'High': 'max',
+    'Low': 'min',
+    'Close': 'last',
+    'Volume': 'sum'
+}
+
+
+def resample_ohlcv(df, timeframe):
+    """Agreguje denní OHLCV na vyšší timeframe (vektorizovaně).
+    
+    Args:
+        df: DataFrame s denními OHLCV daty
+        timeframe: 'W' (týden) nebo 'M' (měsíc)
+    
+    Returns:
+        DataFrame barů s indexem = konec období (období bez obchodů vynechána)
+    """
+    bars = df[list(OHLCV_AGGREGATION)].resample(TIMEFRAMES[timeframe]).agg(OHLCV_AGGREGATION)
+    bars = bars.dropna(subset=['Close'])
+    bars['Volume'] = bars['Volume'].astype(np.int64)
+    return bars
+
+
+def resample_bars(df, symbol, timeframe='D', use_cache=True, cache=None):
+    """
+    Vrátí bary požadovaného timeframe, přepočtené inkrementálně přes cache.
+    
+    Uložená uzavřená období se znovu nepočítají – přepočítá se jen poslední
+    uložené (možná ještě otevřené) období a novější. Pokud cache vznikla
+    z delší historie, přepočítá se z df i první (neúplné) období okna, aby
+    výsledek nezávisel na stavu cache. Při změně korporátních akcí nebo
+    delší požadované historii se bary přepočítají celé.
+    
+    Args:
+        df: DataFrame s denními (upravenými) daty
+        symbol: Ticker symbol
+        timeframe: 'D' (beze změny), 'W' nebo 'M'
+        use_cache: Používat cache
+        cache: DataCache instance
+    
+    Returns:
+        DataFrame s OHLCV bary
+    """
+    if timeframe == 'D':
+        return df
+    
+    if not use_cache:
+        return resample_ohlcv(df, timeframe)
+    
+    if cache is None:
+        cache = DataCache()
+    
+    actions = cache.get_actions(symbol)
+    actions_key = f"{len(actions)}:{epoch_days(actions.index).max() if len(actions) else 0}"
+    first_day = _epoch_day(df.index[0])
+    first_label = TIMEFRAMES[timeframe].rollforward(df.index[0].normalize())
+    
+    cached, meta = cache.get_resampled(symbol, timeframe)
+    if cached is not None:
+        cached = cached[cached.index >= first_label]
+    
+    if (cached is None or len(cached) < 2 or meta['actions_key'] != actions_key
+            or meta['first_day'] > first_day):
+        bars = resample_ohlcv(df, timeframe)
+        cache.save_resampled(symbol, timeframe, bars, actions_key, first_day, replace=True)
+        return bars
+    
+    # Přepočet od konce předposledního uloženého (uzavřeného) období
+    tail = resample_ohlcv(df[df.index > cached.index[-2]], timeframe)
+    cache.save_resampled(symbol, timeframe, tail, actions_key, meta['first_day'])
+    
+    if meta['first_day'] < first_day:
+        # Uložené první období obsahuje i dny před oknem – spočítá se jen z df
+        # (do cache se neukládá, ta drží bary delší historie)
+        head = resample_ohlcv(df[df.index <= cached.index[0]], timeframe)
+        return pd.concat([head, cached.iloc[1:-1], tail])
+    
+    return pd.concat([cached.iloc[:-1], tail])
+
+
 def calculate_daily_return(df):
     """Vypočítá denní procentuální změnu a další technické indikátory."""
     # Standardní denní změna (Close / PrevClose - 1)
@@ -332,7 +885,235 @@ def calculate_daily_return(df):
     return df
 
 
-def identify_extreme_drops(df, threshold=None, percentile=None):
+class OrderStatisticTree:
+    """Fenwickův strom nad ranky hodnot pro průběžné pořadové statistiky.
+    
+    Vkládání, odebrání i dotaz na k-tý nejmenší prvek běží v O(log n),
+    takže percentil pro každý den lze získat bez přepočtu celé historie.
+    """
+    
+    def __init__(self, size):
+        """Inicializace stromu.
+        
+        Args:
+            size: Počet různých ranků (délka setříděného pole hodnot)
+        """
+        self.size = size
+        self.count = 0
+        self._tree = [0] * (size + 1)
+        self._top_bit = 1 << max(size.bit_length() - 1, 0)
+    
+    def add(self, rank, delta=1):
+        """Přidá (delta=1) nebo odebere (delta=-1) hodnotu s daným rankem."""
+        i = rank + 1
+        while i <= self.size:
+            self._tree[i] += delta
+            i += i & -i
+        self.count += delta
+    
+    def kth(self, k):
+        """Vrátí rank k-tého nejmenšího uloženého prvku (k počítáno od 0)."""
+        pos = 0
+        remaining = k + 1
+        step = self._top_bit
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self._tree[nxt] < remaining:
+                pos = nxt
+                remaining -= self._tree[nxt]
+            step >>= 1
+        return pos
+
+
+def point_in_time_percentile(returns, percentile, window=None, min_periods=20):
+    """
+    Vypočítá percentilový práh pro každý den pouze z dat známých k danému dni.
+    
+    Práh dne t je percentil výnosů do dne t včetně (expanding), případně
+    z posledních `window` pozorování (rolling). Interpolace odpovídá
+    np.percentile (linear), celkový čas je O(n log n).
+    
+    Args:
+        returns: Series denních výnosů (NaN se přeskakují)
+        percentile: Percentil (např. 5 pro 5. percentil)
+        window: Délka klouzavého okna v barech (None = expanding)
+        min_periods: Minimální počet pozorování pro výpočet prahu
+    
+    Returns:
+        Series prahů se stejným indexem jako returns (NaN při nedostatku dat)
+    """
+    if window is not None and window < 1:
+        raise ValueError(f"Délka okna musí být alespoň 1 (zadáno {window})")
+    
+    values = returns.to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+    
+    # Ranky všech hodnot spočítáme jednou dopředu (O(n log n))
+    order = np.argsort(values[valid], kind='mergesort')
+    sorted_values = values[valid][order]
+    ranks = np.full(len(values), -1, dtype=np.int64)
+    ranks[np.flatnonzero(valid)[order]] = np.arange(len(order))
+    
+    if window is not None:
+        min_periods = min(min_periods, window)
+    
+    tree = OrderStatisticTree(len(sorted_values))
+    cutoffs = np.full(len(values), np.nan)
+    fraction = percentile / 100.0
+    
+    for i in range(len(values)):
+        if ranks[i] >= 0:
+            tree.add(ranks[i])
+        
+        # Vypadnutí nejstaršího pozorování z klouzavého okna
+        if window is not None and i >= window and ranks[i - window] >= 0:
+            tree.add(ranks[i - window], -1)
+        
+        if tree.count < max(min_periods, 1):
+            continue
+        
+        h = (tree.count - 1) * fraction
+        lower = int(np.floor(h))
+        value = sorted_values[tree.kth(lower)]
+        if h > lower:
+            upper_value = sorted_values[tree.kth(lower + 1)]
+            value = value + (h - lower) * (upper_value - value)
+        cutoffs[i] = value
+    
+    return pd.Series(cutoffs, index=returns.index)
+
+
+CONDITION_OPERATORS = {
+    '<=': operator.le,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '>': operator.gt,
+    '==': operator.eq,
+}
+
+CONDITION_PATTERN = re.compile(r'^\s*([^:<>=\s]+)(?::(\w+))?\s*(<=|>=|==|<|>)\s*(-?\d+(?:\.\d+)?)\s*$')
+
+
+def parse_condition(text):
+    """
+    Rozparsuje podmínku ve tvaru SYMBOL[:POLE]<op>HODNOTA.
+    
+    Příklady: "^VIX>30", "QQQ:SMA200_Dist>0", "SPY:Return<-2"
+    
+    Returns:
+        (symbol, pole, operátor, hodnota)
+    """
+    match = CONDITION_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"Neplatná podmínka: '{text}' (očekáváno např. '^VIX>30' nebo 'SPY:Return<-2')")
+    
+    symbol, field, op, value = match.groups()
+    field = field or 'Close'
+    if field not in AuxiliaryPanel.FIELDS:
+        raise ValueError(f"Neznámé pole '{field}' v podmínce '{text}' (dostupné: {', '.join(AuxiliaryPanel.FIELDS)})")
+    
+    return symbol, field, op, float(value)
+
+
+class AuxiliaryPanel:
+    """Pomocné řady (např. ^VIX, SPY) zarovnané na index primárních dat.
+    
+    Každý symbol se stáhne přes DataCache a připojí k primárnímu indexu jen
+    jednou za běh, masky podmínek se také memoizují, takže libovolné
+    kombinace podmínek panel znovu nespojují.
+    
+    Pole pro každý symbol:
+        Close        - uzavírací cena (úroveň, např. VIX)
+        Return       - denní změna v % (stejný den)
+        SMA200_Dist  - vzdálenost Close od 200denního SMA v %
+    
+    U vyššího timeframe se pole berou za stejné období (Close a SMA200_Dist
+    na konci období, Return za celé období); SMA zůstává denní.
+    """
+    
+    FIELDS = ('Close', 'Return', 'SMA200_Dist')
+    SMA_WINDOW = 200
+    
+    def __init__(self, primary_df, primary_symbol, years, use_cache=True, cache=None, timeframe='D'):
+        """Inicializace panelu.
+        
+        Args:
+            primary_df: DataFrame primárního symbolu (určuje index)
+            primary_symbol: Ticker primárního symbolu
+            years: Počet let historie primárních dat
+            use_cache: Používat cache
+            cache: DataCache instance
+            timeframe: Timeframe primárních dat ('D', 'W', 'M')
+        """
+        self.index = primary_df.index
+        self.timeframe = timeframe
+        self.primary_symbol = primary_symbol
+        self.years = years
+        self.use_cache = use_cache
+        self.cache = cache
+        self._aligned = {}
+        self._masks = {}
+        self._lock = threading.Lock()
+    
+    def _features(self, df):
+        """Spočítá pole symbolu na jeho vlastním kalendáři."""
+        close = df['Close']
+        features = pd.DataFrame({
+            'Close': close,
+            'Return': close.pct_change() * 100,
+            'SMA200_Dist': (close / close.rolling(window=self.SMA_WINDOW).mean() - 1) * 100
+        })
+        
+        if self.timeframe != 'D':
+            bars = resample_ohlcv(df, self.timeframe)
+            features = pd.DataFrame({
+                'Close': bars['Close'],
+                'Return': bars['Close'].pct_change() * 100,
+                'SMA200_Dist': features['SMA200_Dist'].resample(TIMEFRAMES[self.timeframe]).last()
+            }).loc[bars.index]
+        
+        return features
+    
+    def aligned(self, symbol):
+        """Vrátí pole symbolu zarovnaná na primární index (memoizováno).
+        
+        Úrovně (Close, SMA200_Dist) se přenáší dopředu přes chybějící dny,
+        denní změna ne – den bez obchodu pomocného symbolu podmínku nesplní.
+        """
+        with self._lock:
+            if symbol not in self._aligned:
+                if symbol != self.primary_symbol:
+                    print(f"Načítám pomocnou řadu {symbol}...")
+                # +1 rok historie navíc pro zahřátí SMA200 (i u primárního symbolu,
+                # jehož data začínají až na začátku analyzovaného období)
+                df = download_qqq_data(symbol=symbol, years=self.years + 1, use_cache=self.use_cache, cache=self.cache)
+                
+                aligned = self._features(df).reindex(self.index)
+                aligned[['Close', 'SMA200_Dist']] = aligned[['Close', 'SMA200_Dist']].ffill()
+                self._aligned[symbol] = aligned
+            
+            return self._aligned[symbol]
+    
+    def condition_mask(self, condition):
+        """Vrátí bool Series pro jednu podmínku (memoizováno podle textu podmínky)."""
+        key = condition.replace(' ', '')
+        if key not in self._masks:
+            symbol, field, op, value = parse_condition(condition)
+            series = self.aligned(symbol)[field]
+            # NaN (chybějící data) podmínku nesplní
+            self._masks[key] = CONDITION_OPERATORS[op](series, value) & series.notna()
+        return self._masks[key]
+    
+    def mask(self, conditions):
+        """Vrátí bool Series, kde platí všechny podmínky současně."""
+        result = pd.Series(True, index=self.index)
+        for condition in conditions:
+            result &= self.condition_mask(condition)
+        return result
+
+
+def identify_extreme_drops(df, threshold=None, percentile=None, point_in_time=False, window=None,
+                           verbose=True, conditions=None, panel=None):
     """
     Identifikuje extrémní denní propady.
     
@@ -340,9 +1121,14 @@ def identify_extreme_drops(df, threshold=None, percentile=None):
         df: DataFrame s cenovými daty
         threshold: Procentuální práh (např. -3.0 pro -3%)
         percentile: Percentil (např. 5 pro 5. percentil nejhorších poklesů)
+        point_in_time: Percentil počítat jen z dat známých k danému dni (bez lookahead)
+        window: Délka klouzavého okna pro point-in-time percentil (None = expanding)
+        verbose: Vypsat počet nalezených dnů
+        conditions: Seznam podmínek na pomocné řady (např. ["^VIX>30"])
+        panel: AuxiliaryPanel pro vyhodnocení podmínek
     
     Returns:
-        (DataFrame, float) - Filtrovaná data a použitý práh
+        (DataFrame, float) - Filtrovaná data a použitý práh (u point-in-time práh posledního dne)
     """
     if threshold is None and percentile is None:
         threshold = -3.0  # výchozí práh
@@ -352,12 +1138,30 @@ def identify_extreme_drops(df, threshold=None, percentile=None):
     if threshold is not None:
         cutoff = threshold
         extreme_drops = df[df['Daily_Return'] < threshold].copy()
-        print(f"\nIdentifikováno {len(extreme_drops)} dnů s propadem < {threshold}%")
+        message = f"Identifikováno {len(extreme_drops)} dnů s propadem < {threshold}%"
+    elif point_in_time:
+        # Práh každého dne jen z historie do daného dne
+        cutoffs = point_in_time_percentile(df['Daily_Return'], percentile, window=window)
+        extreme_drops = df[df['Daily_Return'] <= cutoffs].copy()
+        extreme_drops['Cutoff'] = cutoffs[extreme_drops.index]
+        known = cutoffs.dropna()
+        cutoff = known.iloc[-1] if not known.empty else np.nan
+        mode = f"klouzavé okno {window} dnů" if window else "expanding"
+        message = f"Identifikováno {len(extreme_drops)} dnů ({percentile}. percentil point-in-time, {mode}, aktuální práh {cutoff:.2f}%)"
     else:
         # Používáme percentil nejhorších propadů
         cutoff = np.percentile(df['Daily_Return'].dropna(), percentile)
         extreme_drops = df[df['Daily_Return'] <= cutoff].copy()
-        print(f"\nIdentifikováno {len(extreme_drops)} dnů ({percentile}. percentil, práh {cutoff:.2f}%)")
+        message = f"Identifikováno {len(extreme_drops)} dnů ({percentile}. percentil, práh {cutoff:.2f}%)"
+    
+    if conditions:
+        # Podmínky filtrují jen události, práh zůstává nepodmíněný
+        mask = panel.mask(conditions).reindex(extreme_drops.index, fill_value=False)
+        extreme_drops = extreme_drops[mask.to_numpy(dtype=bool)]
+        message += f", z toho {len(extreme_drops)} při {' a '.join(conditions)}"
+    
+    if verbose:
+        print(f"\n{message}")
     
     return extreme_drops, cutoff
 
@@ -432,7 +1236,8 @@ def wilson_confidence_interval(successes, n, confidence=0.95):
     return p_hat, lower, upper
 
 
-def export_results_to_csv(gap_results, threshold=None, percentile=None, years=None, symbol='QQQ'):
+def export_results_to_csv(gap_results, threshold=None, percentile=None, years=None, symbol='QQQ',
+                          point_in_time=False, window=None, conditions=None, timeframe='D'):
     """Exportuje kompletní výsledky analýzy do CSV včetně statistiky."""
     if gap_results is None or len(gap_results) == 0:
         print("Žádné výsledky k exportu.")
@@ -449,10 +1254,16 @@ def export_results_to_csv(gap_results, threshold=None, percentile=None, years=No
         f.write("# QQQ GAP-UP ANALÝZA\n")
         f.write(f"# Symbol: {symbol}\n")
         f.write(f"# Období: posledních {years} let\n")
+        if timeframe != 'D':
+            f.write(f"# Timeframe: {timeframe}\n")
         if threshold:
             f.write(f"# Práh: {threshold}%\n")
         if percentile:
             f.write(f"# Percentil: {percentile}\n")
+            if point_in_time:
+                f.write(f"# Point-in-time: {'okno ' + str(window) + ' dnů' if window else 'expanding'}\n")
+        if conditions:
+            f.write(f"# Podmínky: {' a '.join(conditions)}\n")
         f.write(f"# Datum exportu: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
         f.write("#\n")
         
@@ -479,17 +1290,49 @@ def export_results_to_csv(gap_results, threshold=None, percentile=None, years=No
     return filename
 
 
-def analyze_results(gap_results):
-    """Analyzuje výsledky a vypočítá statistiku."""
+def compute_stats(gap_results):
+    """Vypočítá souhrnnou statistiku výsledků (bez výpisu).
+    
+    Returns:
+        Dict se statistikou nebo None, pokud nejsou žádné výsledky
+    """
     if len(gap_results) == 0:
-        print("Žádné relevantní následující dny pro analýzu.")
-        return
+        return None
     
     total_days = len(gap_results)
     gap_up_days = gap_results['Gap_Up'].sum()
     
     point_est, lower, upper = wilson_confidence_interval(gap_up_days, total_days)
     
+    return {
+        'total_days': total_days,
+        'gap_up_days': gap_up_days,
+        'gap_down_days': total_days - gap_up_days,
+        'probability': point_est * 100,
+        'ci_lower': lower * 100,
+        'ci_upper': upper * 100,
+        'avg_gap': gap_results['Next_Gap_Percent'].mean(),
+        'median_gap': gap_results['Next_Gap_Percent'].median(),
+        'std_gap': gap_results['Next_Gap_Percent'].std(),
+        'avg_drop': gap_results['Drop_Return'].mean(),
+        'min_drop': gap_results['Drop_Return'].min(),
+        'max_drop': gap_results['Drop_Return'].max()
+    }
+
+
+def analyze_results(gap_results):
+    """Analyzuje výsledky a vypočítá statistiku."""
+    stats = compute_stats(gap_results)
+    if stats is None:
+        print("Žádné relevantní následující dny pro analýzu.")
+        return
+    
+    total_days = stats['total_days']
+    gap_up_days = stats['gap_up_days']
+    point_est = stats['probability'] / 100
+    lower = stats['ci_lower'] / 100
+    upper = stats['ci_upper'] / 100
+    
     print("\n" + "="*70)
     print("VÝSLEDKY ANALÝZY")
     print("="*70)
@@ -536,30 +1379,30 @@ def analyze_results(gap_results):
     print(gap_results.head(10).to_string(index=False))
     
     # Přidej statistiku do dataframe pro CSV export
-    gap_results.attrs['stats'] = {
-        'total_days': total_days,
-        'gap_up_days': gap_up_days,
-        'gap_down_days': total_days - gap_up_days,
-        'probability': point_est * 100,
-        'ci_lower': lower * 100,
-        'ci_upper': upper * 100,
-        'avg_gap': gap_results['Next_Gap_Percent'].mean(),
-        'median_gap': gap_results['Next_Gap_Percent'].median(),
-        'std_gap': gap_results['Next_Gap_Percent'].std(),
-        'avg_drop': gap_results['Drop_Return'].mean(),
-        'min_drop': gap_results['Drop_Return'].min(),
-        'max_drop': gap_results['Drop_Return'].max()
-    }
+    gap_results.attrs['stats'] = stats
     
     return gap_results
 
 
-def print_current_status(df, cutoff, stats):
-    """Vytiskne informaci o aktuálním stavu trhu."""
+# Popisky aktuální změny a následujícího období podle timeframe
+CHANGE_LABELS = {'D': 'Dnešní změna', 'W': 'Změna za týden', 'M': 'Změna za měsíc'}
+NEXT_PERIOD_LABELS = {'D': 'zítra', 'W': 'příští týden', 'M': 'příští měsíc'}
+
+
+def print_current_status(df, cutoff, stats, conditions=None, panel=None, timeframe='D', as_of=None):
+    """Vytiskne informaci o aktuálním stavu trhu.
+    
+    Při zadaných podmínkách na pomocné řady je signál aktivní jen tehdy,
+    když podmínky platí i pro poslední den.
+    
+    U vyššího timeframe je index poslední bar období (např. konec měsíce
+    v budoucnu), proto se v hlavičce zobrazuje datum posledního denního
+    baru `as_of`.
+    """
     if df is None or df.empty:
         return
 
-    last_date = df.index[-1]
+    last_date = as_of if as_of is not None else df.index[-1]
     last_row = df.iloc[-1]
     
     # Získej hodnoty bezpečně (scalar)
@@ -573,17 +1416,22 @@ def print_current_status(df, cutoff, stats):
     print("="*70)
     
     print(f"  Cena Close:      {last_close:.2f}")
-    print(f"  Dnešní změna:    {last_drop:.2f}%")
+    print(f"  {CHANGE_LABELS[timeframe] + ':':<17}{last_drop:.2f}%")
     print(f"  Signální práh:   {cutoff:.2f}%")
     print(f"  RVOL (Objem):    {last_rvol:.2f}x")
     print(f"  Close Loc:       {last_loc:.2f} (0=Low, 1=High)")
     
     is_signal = last_drop < cutoff
     
+    if conditions:
+        conditions_met = bool(panel.mask(conditions).iloc[-1])
+        print(f"  Podmínky:        {' a '.join(conditions)} -> {'splněny' if conditions_met else 'nesplněny'}")
+        is_signal = is_signal and conditions_met
+    
     if is_signal:
         print("\n  ⚠️  SIGNÁL AKTIVNÍ! TRH JE V EXTRÉMNÍM PROPADU ⚠️")
         print(f"  --------------------------------------------------")
-        print(f"  Historická pravděpodobnost Gap Up zítra: {stats['probability']:.2f}%")
+        print(f"  Historická pravděpodobnost Gap Up {NEXT_PERIOD_LABELS[timeframe]}: {stats['probability']:.2f}%")
         print(f"  95% Interval spolehlivosti: [{stats['ci_lower']:.2f}% - {stats['ci_upper']:.2f}%]")
         
         print(f"\n  STRATEGICKÉ VYHODNOCENÍ (SHORT vs BOUNCE):")
@@ -630,12 +1478,34 @@ def main():
         type=float,
         help='Percentil nejhorších propadů (např. 5 pro 5. percentil)'
     )
+    parser.add_argument(
+        '--point-in-time',
+        action='store_true',
+        help='Percentilový práh počítá jen z dat známých k danému dni (bez lookahead)'
+    )
+    parser.add_argument(
+        '--window',
+        type=int,
+        help='Klouzavé okno v obdobích (barech) pro --point-in-time (výchozí: expanding)'
+    )
+    parser.add_argument(
+        '--condition',
+        action='append',
+        dest='conditions',
+        help='Podmínka na pomocnou řadu, lze opakovat (např. "^VIX>30", "QQQ:SMA200_Dist>0", "SPY:Return<-2")'
+    )
     parser.add_argument(
         '--years',
         type=int,
         default=5,
         help='Počet let pro analýzu (výchozí: 5)'
     )
+    parser.add_argument(
+        '--timeframe',
+        choices=list(TIMEFRAMES),
+        default='D',
+        help='Timeframe barů: D (denní), W (týdenní), M (měsíční) (výchozí: D)'
+    )
     parser.add_argument(
         '--save',
         action='store_true',
@@ -662,9 +1532,26 @@ def main():
         default='QQQ',
         help='Ticker symbol (výchozí: QQQ)'
     )
+    parser.add_argument(
+        '--jobs',
+        type=str,
+        help='Job soubor (TOML/YAML) se seznamem analýz pro dávkové spuštění'
+    )
     
     args = parser.parse_args()
     
+    if args.window is not None and args.window < 1:
+        parser.error("--window musí být alespoň 1")
+    if args.window is not None and not args.point_in_time:
+        parser.error("--window lze použít jen s --point-in-time")
+    if args.point_in_time and args.percentile is None:
+        parser.error("--point-in-time lze použít jen s --percentile")
+    for condition in args.conditions or []:
+        try:
+            parse_condition(condition)
+        except ValueError as e:
+            parser.error(str(e))
+    
     # Inicializuj cache
     cache = DataCache()
     
@@ -675,6 +1562,8 @@ def main():
             print(f"Cache pro {args.symbol}:")
             print(f"  Poslední aktualizace: {metadata['last_updated']}")
             print(f"  Rozsah dat: {metadata['start_date']} až {metadata['end_date']}")
+            if metadata['fresh_until']:
+                print(f"  Čerstvá do: {metadata['fresh_until']}")
         else:
             print(f"Žádná cache pro {args.symbol}")
         return
@@ -684,40 +1573,68 @@ def main():
         cache.clear_cache(args.symbol)
         return
     
+    # Dávkové spuštění z job souboru
+    if args.jobs:
+        from batch_jobs import run_job_file
+        filename = run_job_file(args.jobs, use_cache=not args.no_cache, cache=cache)
+        print(f"\nSouhrnné výsledky uloženy do: {filename}")
+        return
+    
     # Výpis parametrů spuštění
     print("\n" + "="*70)
     print(f"SPUŠTĚNÍ ANALÝZY: {args.symbol}")
     print("="*70)
     print(f"  Symbol:          {args.symbol}")
     print(f"  Období:          {args.years} let")
+    if args.timeframe != 'D':
+        print(f"  Timeframe:       {args.timeframe}")
     
     if args.threshold:
         print(f"  Kritérium:       Pevný práh < {args.threshold}%")
     elif args.percentile:
         print(f"  Kritérium:       {args.percentile}. percentil nejhorších propadů")
+        if args.point_in_time:
+            mode = f"klouzavé okno {args.window} dnů" if args.window else "expanding"
+            print(f"  Point-in-time:   Ano ({mode})")
     else:
         print(f"  Kritérium:       Výchozí práh < -3.0%")
+    
+    if args.conditions:
+        print(f"  Podmínky:        {' a '.join(args.conditions)}")
         
     print(f"  Cache:           {'Vypnuta' if args.no_cache else 'Zapnuta'}")
     print(f"  Uložení CSV:     {'Ano' if args.save else 'Ne'}")
     print("-" * 70 + "\n")
     
     # Stažení dat
-    qqq = download_qqq_data(
+    daily = download_qqq_data(
         symbol=args.symbol,
         years=args.years,
         use_cache=not args.no_cache,
         cache=cache
     )
     
+    # Agregace na vyšší timeframe (týdny/měsíce)
+    qqq = resample_bars(daily, args.symbol, args.timeframe, use_cache=not args.no_cache, cache=cache)
+    
     # Výpočet denních propadů a gapů
     qqq = calculate_daily_return(qqq)
     
+    # Pomocné řady pro podmínky (zarovnají se jednou na index)
+    panel = None
+    if args.conditions:
+        panel = AuxiliaryPanel(qqq, args.symbol, args.years, use_cache=not args.no_cache, cache=cache,
+                               timeframe=args.timeframe)
+    
     # Identifikace extrémních propadů
     extreme_drops, cutoff = identify_extreme_drops(
         qqq,
         threshold=args.threshold,
-        percentile=args.percentile
+        percentile=args.percentile,
+        point_in_time=args.point_in_time,
+        window=args.window,
+        conditions=args.conditions,
+        panel=panel
     )
     
     # Analýza následujících dnů
@@ -728,7 +1645,8 @@ def main():
     
     # Zobrazení aktuálního stavu
     if results_df is not None and hasattr(results_df, 'attrs') and 'stats' in results_df.attrs:
-        print_current_status(qqq, cutoff, results_df.attrs['stats'])
+        print_current_status(qqq, cutoff, results_df.attrs['stats'], conditions=args.conditions, panel=panel,
+                             timeframe=args.timeframe, as_of=daily.index[-1])
     
     # Uložení výsledků
     if args.save and results_df is not None:
@@ -737,7 +1655,11 @@ def main():
             threshold=args.threshold,
             percentile=args.percentile,
             years=args.years,
-            symbol=args.symbol
+            symbol=args.symbol,
+            point_in_time=args.point_in_time,
+            window=args.window,
+            conditions=args.conditions,
+            timeframe=args.timeframe
         )
         if filename:
             print(f"\nVýsledky uloženy do: {filename}")